@@ -1,51 +1,153 @@
 import os
 import re
+import logging
 import random
 import pymysql
 import httpx
+import orjson
 import asyncio
+import time
 import tldextract
-from flask import Flask, request, jsonify
-from flask_cors import CORS
+from dbutils.pooled_db import PooledDB
+from contextlib import asynccontextmanager
+from itertools import zip_longest
+from typing import Optional
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 
-# ✅ Create Flask app first
-app = Flask(__name__)
-
-# ✅ Enable CORS only once — restrict to your frontend URL
-CORS(app, resources={r"/*": {"origins": "http://localhost:8080"}})
-
 # ✅ Load environment variables
 load_dotenv()
 
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+# httpx logs every request at INFO, full URL included, which carries the apiKey
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logging.getLogger("httpcore").setLevel(logging.WARNING)
+log = logging.getLogger(__name__)
+
 WHOISXML_API_KEY = os.getenv("WHOISXML_API_KEY")
+WHOISXML_URL = "https://domain-availability.whoisxmlapi.com/api/v1"
+# fixed query params; only domainName varies per lookup
+WHOISXML_PARAMS = {"apiKey": WHOISXML_API_KEY, "outputFormat": "JSON"}
 DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_USER = os.getenv("DB_USER", "root")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "")
 DB_NAME = os.getenv("DB_NAME", "domain_saas")
 APP_NAME = os.getenv("APP_NAME", "Domain Suggester SaaS")
+CHECK_CONCURRENCY = int(os.getenv("CHECK_CONCURRENCY", 16))
+REDIS_URL = os.getenv("REDIS_URL")
+# taken domains rarely free up, so they can be cached much longer than free ones
+AVAILABLE_CACHE_TTL = int(os.getenv("AVAILABLE_CACHE_TTL", 300))
+UNAVAILABLE_CACHE_TTL = int(os.getenv("UNAVAILABLE_CACHE_TTL", 86400))
+CACHE_MAXSIZE = int(os.getenv("CACHE_MAXSIZE", 10000))
 
 if not WHOISXML_API_KEY:
     raise ValueError("WHOISXML_API_KEY missing in .env")
 
+# -------------------------
+# Shared HTTP client
+# -------------------------
+# One pooled client for the whole process so WhoisXML calls reuse warm
+# keep-alive connections instead of paying a TCP+TLS handshake per lookup.
+# With HTTP/2, concurrent lookups multiplex as streams on one connection.
+CLIENT = httpx.AsyncClient(
+    http2=True,
+    timeout=10.0,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=600),
+)
+
+async def warm_connection():
+    """Open the pooled WhoisXML connection at startup (DNS, TCP, TLS and the
+    HTTP/2 handshake) so the first /check reuses it. The HEAD carries no
+    apiKey, so it is not a billed lookup; its status is ignored."""
+    try:
+        await CLIENT.head(WHOISXML_URL)
+    except httpx.HTTPError as e:
+        log.warning("Warming the WhoisXML connection failed: %s", e)
+
+# -------------------------
+# Availability cache
+# -------------------------
+# In-process TTL cache, backed by Redis when REDIS_URL is set so that all
+# workers share lookups. Only definitive WhoisXML answers are cached.
+_availability_cache = {}  # fqdn -> (available, expires_at)
+
+if REDIS_URL:
+    import redis.asyncio as aioredis
+    REDIS = aioredis.from_url(REDIS_URL)
+else:
+    REDIS = None
+
+def _cache_put_local(domain: str, available: bool, ttl: float):
+    if len(_availability_cache) >= CACHE_MAXSIZE:
+        # dicts keep insertion order: drop the oldest entry
+        _availability_cache.pop(next(iter(_availability_cache)))
+    _availability_cache[domain] = (available, time.monotonic() + ttl)
+
+async def cache_get(domain: str) -> Optional[bool]:
+    """Return the cached availability for domain, or None on a miss."""
+    hit = _availability_cache.get(domain)
+    if hit:
+        available, expires_at = hit
+        if expires_at > time.monotonic():
+            return available
+        del _availability_cache[domain]
+
+    if REDIS is None:
+        return None
+    try:
+        async with REDIS.pipeline(transaction=False) as pipe:
+            value, ttl = await pipe.get(f"whois:{domain}").ttl(f"whois:{domain}").execute()
+    except Exception as e:
+        log.error("Redis lookup failed for %s: %s", domain, e)
+        return None
+    if value is None:
+        return None
+    available = value == b"1"
+    _cache_put_local(domain, available, max(ttl, 1))
+    return available
+
+async def cache_set(domain: str, available: bool):
+    ttl = AVAILABLE_CACHE_TTL if available else UNAVAILABLE_CACHE_TTL
+    _cache_put_local(domain, available, ttl)
+    if REDIS is None:
+        return
+    try:
+        await REDIS.set(f"whois:{domain}", "1" if available else "0", ex=ttl)
+    except Exception as e:
+        log.error("Redis store failed for %s: %s", domain, e)
+
 
 # -------------------------
 # Database helpers
 # -------------------------
-def get_db_connection():
+# warm connections shared by all requests instead of a handshake per call
+DB_SETTINGS = dict(
+    host=DB_HOST,
+    user=DB_USER,
+    password=DB_PASSWORD,
+    database=DB_NAME,
+    charset='utf8mb4',
+    cursorclass=pymysql.cursors.DictCursor,
+)
+# single-statement work: autocommit skips the extra COMMIT round-trip, and
+# reset=False stops the pool issuing a ROLLBACK when a connection returns
+POOL = PooledDB(creator=pymysql, mincached=2, maxcached=10, maxconnections=20,
+                blocking=True, reset=False, autocommit=True, **DB_SETTINGS)
+# multi-statement transactions; connections are opened on demand
+TX_POOL = PooledDB(creator=pymysql, mincached=0, maxcached=5, maxconnections=10,
+                   blocking=True, autocommit=False, **DB_SETTINGS)
+
+def get_db_connection(transactional=False):
     """
-    Returns a new pymysql connection.
-    Note: for production consider a connection pool.
+    Returns a pooled pymysql connection; close() hands it back to the pool.
+    Pass transactional=True when several statements must commit together.
     """
-    return pymysql.connect(
-        host=DB_HOST,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        database=DB_NAME,
-        charset='utf8mb4',
-        cursorclass=pymysql.cursors.DictCursor,
-        autocommit=False
-    )
+    return (TX_POOL if transactional else POOL).connection()
 
 def init_db():
     """Create required tables if they don't exist."""
@@ -59,10 +161,45 @@ def init_db():
                     email VARCHAR(255) NOT NULL,
                     notified BOOLEAN DEFAULT FALSE,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_checked_at TIMESTAMP NULL
+                    last_checked_at TIMESTAMP NULL,
+                    fail_count INT NOT NULL DEFAULT 0,
+                    next_check_at TIMESTAMP NULL,
+                    INDEX idx_pending (notified, last_checked_at)
                 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
             """)
-        conn.commit()
+            # backoff columns for tables created before they existed
+            cur.execute("""
+                SELECT column_name AS name FROM information_schema.columns
+                WHERE table_schema = DATABASE() AND table_name = 'domain_notifications'
+            """)
+            columns = {row["name"] for row in cur.fetchall()}
+            if "fail_count" not in columns:
+                cur.execute("ALTER TABLE domain_notifications ADD COLUMN fail_count INT NOT NULL DEFAULT 0")
+            if "next_check_at" not in columns:
+                cur.execute("ALTER TABLE domain_notifications ADD COLUMN next_check_at TIMESTAMP NULL")
+            # tables created before the index existed; MySQL has no
+            # CREATE INDEX IF NOT EXISTS, so look it up first
+            cur.execute("""
+                SELECT 1 FROM information_schema.statistics
+                WHERE table_schema = DATABASE()
+                  AND table_name = 'domain_notifications'
+                  AND index_name = 'idx_pending'
+                LIMIT 1
+            """)
+            if not cur.fetchone():
+                cur.execute("CREATE INDEX idx_pending ON domain_notifications (notified, last_checked_at)")
+    finally:
+        conn.close()
+
+def save_notification(domain: str, email: str):
+    """Insert a pending notification (autocommit: the INSERT is the whole transaction)."""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO domain_notifications (domain_name, email, notified) VALUES (%s,%s,%s)",
+                (domain, email, False)
+            )
     finally:
         conn.close()
 
@@ -72,30 +209,92 @@ init_db()
 # -------------------------
 # Helper logic
 # -------------------------
+# TLDs this app deals with; these skip tldextract's public suffix list walk
+SUFFIX_SET = {"com", "io", "co", "xyz", "net", "org"}
+
+# Fallback extractor built from the bundled PSL snapshot: no network fetch,
+# no disk cache, and warmed here so the first request doesn't pay the parse.
+EXTRACTOR = tldextract.TLDExtract(suffix_list_urls=(), cache_dir=None, fallback_to_snapshot=True)
+EXTRACTOR("example.com")
+
+def split_domain(domain: str):
+    """Split a domain into (name, suffix); suffix is "" for bare keywords.
+    Plain name.tld inputs on a known TLD take the fast path, anything else
+    (subdomains, co.uk-style suffixes) falls back to tldextract."""
+    name, dot, tail = domain.rpartition(".")
+    if not dot:
+        return domain, ""
+    if tail in SUFFIX_SET and name and "." not in name:
+        return name, tail
+    ext = EXTRACTOR(domain)
+    return ext.domain, ext.suffix
+
 def classify_input(user_input: str) -> str:
-    ext = tldextract.extract(user_input)
-    return "full_domain" if ext.suffix else "brand_keyword"
+    return "full_domain" if split_domain(user_input)[1] else "brand_keyword"
+
+class RateLimited(Exception):
+    """WhoisXML answered 429; retry_after is its suggested wait in seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"WhoisXML rate limit reached, retry after {retry_after}s")
+        self.retry_after = retry_after
 
 async def check_domain_availability(domain: str) -> bool:
-    """Query WhoisXML domain availability API. Returns True if AVAILABLE."""
-    url = (
-        f"https://domain-availability.whoisxmlapi.com/api/v1"
-        f"?apiKey={WHOISXML_API_KEY}&domainName={domain}&outputFormat=JSON"
-    )
+    """Query WhoisXML domain availability API. Returns True if AVAILABLE.
+    Raises RateLimited on a 429 so callers can stop and back off."""
+    domain = domain.lower()
+    cached = await cache_get(domain)
+    if cached is not None:
+        return cached
+
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            r = await client.get(url)
-            data = r.json()
+        r = await CLIENT.get(WHOISXML_URL, params={**WHOISXML_PARAMS, "domainName": domain})
+    except Exception as e:
+        log.error("Whois check failed for %s: %s", domain, e)
+        return False
+
+    # error envelopes carry no availability; don't spend time decoding them
+    if r.status_code == 429:
+        retry_after = r.headers.get("Retry-After", "")
+        raise RateLimited(int(retry_after) if retry_after.isdigit() else 1)
+    if not r.is_success:
+        log.error("Whois check failed for %s: HTTP %s", domain, r.status_code)
+        return False
+
+    try:
+        data = orjson.loads(r.content)
         status = data.get("DomainInfo", {}).get("domainAvailability", "UNKNOWN").strip().lower()
-        print(f"[DEBUG] WhoisXML Response for {domain}: {status}")  # optional for testing
+        log.debug("WhoisXML %s -> %s", domain, status)
+        if status in ("available", "unavailable"):
+            await cache_set(domain, status == "available")
         return status == "available"
 
     except Exception as e:
-        print(f"[ERROR] Whois check failed for {domain}: {e}")
+        log.error("Whois check failed for %s: %s", domain, e)
         return False
 
+async def check_many(domains):
+    """Check many domains concurrently, at most CHECK_CONCURRENCY in flight.
+    Returns (domain, available) pairs in input order. The first RateLimited
+    cancels the lookups still pending and is re-raised."""
+    sem = asyncio.Semaphore(CHECK_CONCURRENCY)
+
+    async def one(domain):
+        async with sem:
+            return domain, await check_domain_availability(domain)
+
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tasks = [tg.create_task(one(d)) for d in domains]
+    except* RateLimited as eg:
+        raise eg.exceptions[0] from None
+    return [t.result() for t in tasks]
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]')
+_EMAIL = re.compile(r'[^@]+@[^@]+\.[^@]+')
+
 def sanitize_word(w: str) -> str:
-    return re.sub(r'[^a-z0-9]', '', w.strip().lower())
+    return _NON_ALNUM.sub('', w.strip().lower())
 
 PREFIXES = ["get", "try", "go", "my", "join", "the"]
 SUFFIXES = ["app", "hq", "site", "online", "tech", "co", "now"]
@@ -103,144 +302,156 @@ TLDS = [".com", ".io", ".co", ".xyz", ".net"]
 
 def generate_domain_ideas(keyword: str, limit=20):
     k = sanitize_word(keyword)
-    ideas = set()
-    for pre in PREFIXES:
-        ideas.add(f"{pre}{k}")
-    for suf in SUFFIXES:
-        ideas.add(f"{k}{suf}")
-        ideas.add(f"{k}-{suf}")
-    ideas.add(k)
-    ideas.add(f"{k}{random.choice(SUFFIXES)}")
-    for pre in PREFIXES[:3]:
-        for suf in SUFFIXES[:3]:
-            ideas.add(f"{pre}{k}{suf}")
-    ideas = list(ideas)[:limit]
+    groups = [
+        [f"{pre}{k}" for pre in PREFIXES],
+        [f"{k}{suf}" for suf in SUFFIXES],
+        [f"{k}-{suf}" for suf in SUFFIXES],
+        [f"{pre}{k}{suf}" for pre in PREFIXES[:3] for suf in SUFFIXES[:3]],
+    ]
+    # round-robin over the groups so every shape survives the limit cut
+    ideas = [k, *(name for row in zip_longest(*groups) for name in row if name)]
+    # dict.fromkeys drops duplicates but keeps the order above
+    ideas = list(dict.fromkeys(ideas))[:limit]
     return [f"{name}{random.choice(TLDS)}" for name in ideas]
 
 async def suggest_alternatives(domain: str):
-    ext = tldextract.extract(domain)
-    base = ext.domain.lower()
+    base, suffix = split_domain(domain)
+    base = base.lower()
 
     # build candidate list
-    alternatives = [f"{base}{tld}" for tld in TLDS if tld != f".{ext.suffix}"]
+    alternatives = [f"{base}{tld}" for tld in TLDS if tld != f".{suffix}"]
 
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        tasks = [
-            client.get(
-                f"https://domain-availability.whoisxmlapi.com/api/v1?apiKey={WHOISXML_API_KEY}&domainName={alt}&outputFormat=JSON"
-            )
-            for alt in alternatives
-        ]
-        responses = await asyncio.gather(*tasks, return_exceptions=True)
+    # go through check_domain_availability so alternatives share the cache;
+    # failed lookups come back as unavailable, so every candidate is shown
+    try:
+        checked = await check_many(alternatives)
+    except RateLimited as e:
+        # the primary answer is already known; don't fail /check over extras
+        log.warning("Skipping alternatives for %s: %s", domain, e)
+        return []
+    return [{"fqdn": alt, "available": available} for alt, available in checked]
 
-    results = []
-    for alt, resp in zip(alternatives, responses):
-        if isinstance(resp, Exception):
-            continue
-        try:
-            data = resp.json()
-            status = data.get("DomainInfo", {}).get("domainAvailability", "UNKNOWN").strip().lower()
-            results.append({
-                "fqdn": alt,
-                "available": status == "available"
-            })
-        except Exception:
-            pass
 
-    # fallback: if all unavailable, still show them
-    if not results:
-        results = [{"fqdn": alt, "available": False} for alt in alternatives]
+# -------------------------
+# App
+# -------------------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await warm_connection()
+    yield
+    await CLIENT.aclose()
+    if REDIS is not None:
+        await REDIS.aclose()
 
-    return results
+# ✅ Create FastAPI app
+app = FastAPI(title=APP_NAME, lifespan=lifespan)
+
+# ✅ Enable CORS only once — restrict to your frontend URL
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["http://localhost:8080"],
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+@app.exception_handler(RateLimited)
+async def rate_limited_handler(request: Request, exc: RateLimited):
+    return JSONResponse(
+        {"error": "domain lookups are rate limited, try again shortly"},
+        status_code=429,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+async def read_json(request: Request) -> dict:
+    """Request body as a dict, like Flask's `request.get_json() or {}`:
+    a missing, malformed or non-object body counts as empty, so the routes
+    answer with their own 400s instead of FastAPI's 422."""
+    try:
+        data = await request.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+def text_field(data: dict, key: str) -> str:
+    """Stripped, lowercased string field; non-strings count as missing."""
+    value = data.get(key)
+    return value.strip().lower() if isinstance(value, str) else ""
 
 
 # -------------------------
 # Routes
 # -------------------------
-@app.route("/", methods=["GET"])
-def home():
-    return jsonify({
+@app.get("/")
+async def home():
+    return {
         "message": f"Welcome to {APP_NAME} API 🚀",
         "usage": "POST /check { 'input_text': 'example.com' } | POST /notify { 'domain':'example.com','email':'you@me.com' }"
-    })
+    }
 
-@app.route("/check", methods=["POST"])
-def check_domain():
-    data = request.get_json() or {}
-    user_input = (data.get("input_text") or "").strip().lower()
+@app.post("/check")
+async def check_domain(request: Request):
+    data = await read_json(request)
+    user_input = text_field(data, "input_text")
     if not user_input:
-        return jsonify({"error": "input_text required"}), 400
+        return JSONResponse({"error": "input_text required"}, status_code=400)
 
     mode = classify_input(user_input)
 
-    # run async functions with event loop wrapper
-    import asyncio
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-
     if mode == "full_domain":
-        available = loop.run_until_complete(check_domain_availability(user_input))
+        available = await check_domain_availability(user_input)
         if available:
-            return jsonify({
+            return {
                 "status": "available",
                 "domain": user_input,
                 "message": f"✅ {user_input} is available!"
-            })
+            }
         else:
-            alternatives = loop.run_until_complete(suggest_alternatives(user_input))
-            return jsonify({
+            alternatives = await suggest_alternatives(user_input)
+            return {
                 "status": "unavailable",
                 "domain": user_input,
                 "message": f"❌ {user_input} is not available.",
                 "alternatives": alternatives,
                 "allow_notification": True
-            })
+            }
     else:
         suggestions = generate_domain_ideas(user_input)
-        results = []
-        for domain in suggestions:
-            available = loop.run_until_complete(check_domain_availability(domain))
-            results.append({"fqdn": domain, "available": available})
-        return jsonify({
+        results = [
+            {"fqdn": domain, "available": available}
+            for domain, available in await check_many(suggestions)
+        ]
+        return {
             "status": "suggestions",
             "keyword": user_input,
             "results": results
-        })
+        }
 
-@app.route("/notify", methods=["POST"])
-def subscribe_for_notification():
+@app.post("/notify")
+async def subscribe_for_notification(request: Request):
     """
     Save domain & email to DB for later re-check.
     Example body: {"domain":"socialeagle.com", "email":"me@example.com"}
     """
-    data = request.get_json() or {}
-    domain = (data.get("domain") or "").strip().lower()
-    email = (data.get("email") or "").strip().lower()
+    data = await read_json(request)
+    domain = text_field(data, "domain")
+    email = text_field(data, "email")
 
     if not domain or not email:
-        return jsonify({"error": "domain and email required"}), 400
+        return JSONResponse({"error": "domain and email required"}, status_code=400)
 
     # basic email validation
-    if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
-        return jsonify({"error": "invalid email"}), 400
+    if not _EMAIL.match(email):
+        return JSONResponse({"error": "invalid email"}, status_code=400)
 
-    # insert to DB
-    conn = get_db_connection()
+    # insert to DB; in a worker thread so the blocking call doesn't stall the loop
     try:
-        with conn.cursor() as cur:
-            cur.execute(
-                "INSERT INTO domain_notifications (domain_name, email, notified) VALUES (%s,%s,%s)",
-                (domain, email, False)
-            )
-        conn.commit()
+        await asyncio.to_thread(save_notification, domain, email)
     except Exception as e:
-        conn.rollback()
-        print("[DB ERROR]", e)
-        return jsonify({"error": "db error"}), 500
-    finally:
-        conn.close()
+        log.error("DB error saving notification for %s: %s", domain, e)
+        return JSONResponse({"error": "db error"}, status_code=500)
 
-    return jsonify({"message": f"You will be notified when {domain} becomes available.", "domain": domain, "email": email})
+    return {"message": f"You will be notified when {domain} becomes available.", "domain": domain, "email": email}
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8000, debug=True)
+    import uvicorn
+    uvicorn.run("app:app", host="0.0.0.0", port=8000, loop="uvloop", http="httptools", workers=2)
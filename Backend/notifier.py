@@ -1,16 +1,28 @@
 # notifier.py
 import os
 import time
+import logging
+import random
+import asyncio
 import smtplib
+from datetime import datetime
 import httpx
+import orjson
 import pymysql
+from dbutils.pooled_db import PooledDB
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from email.mime.text import MIMEText
 from dotenv import load_dotenv
 
 # Load env variables
 load_dotenv()
 
+log = logging.getLogger("notifier")
+
 WHOISXML_API_KEY = os.getenv("WHOISXML_API_KEY")
+WHOISXML_URL = "https://domain-availability.whoisxmlapi.com/api/v1"
+# fixed query params; only domainName varies per lookup
+WHOISXML_PARAMS = {"apiKey": WHOISXML_API_KEY, "outputFormat": "JSON"}
 
 DB_HOST = os.getenv("DB_HOST")
 DB_USER = os.getenv("DB_USER")
@@ -22,37 +34,114 @@ EMAIL_PORT = int(os.getenv("EMAIL_PORT", 587))
 EMAIL_USER = os.getenv("EMAIL_USER")
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
 
+CHECK_CONCURRENCY = int(os.getenv("NOTIFIER_CHECK_CONCURRENCY", 32))
+RECHECK_HOURS = int(os.getenv("RECHECK_HOURS", 6))
+BATCH_SIZE = int(os.getenv("NOTIFIER_BATCH_SIZE", 500))
+POLL_SECONDS = int(os.getenv("NOTIFIER_POLL_SECONDS", 30))
+# failed lookups are retried after BACKOFF_BASE * 2**fail_count seconds
+BACKOFF_BASE = int(os.getenv("NOTIFIER_BACKOFF_BASE", 60))
+BACKOFF_MAX = int(os.getenv("NOTIFIER_BACKOFF_MAX", 6 * 3600))
+# SMTP sessions per pass, each driven from its own worker thread; every
+# extra session costs another TLS handshake and AUTH, so keep this at 1
+# unless a single session can't keep up
+SMTP_SESSIONS = int(os.getenv("NOTIFIER_SMTP_SESSIONS", 1))
+
+if SMTP_SESSIONS < 1:
+    raise ValueError("NOTIFIER_SMTP_SESSIONS must be at least 1")
+
+# -------------------------------
+# Shared HTTP client
+# -------------------------------
+# One pooled client for the life of the process, so successive checks
+# reuse keep-alive connections to WhoisXML. Closed when main() exits.
+CLIENT = httpx.AsyncClient(
+    http2=True,
+    timeout=10.0,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=600),
+)
+
+async def warm_connection():
+    """Connect to WhoisXML before the first pass so its lookups start on an
+    open connection. Sent without apiKey, so it costs no lookup credit."""
+    try:
+        await CLIENT.head(WHOISXML_URL)
+    except httpx.HTTPError as e:
+        log.warning("Warming the WhoisXML connection failed: %s", e)
+
+# monotonic deadline set from WhoisXML's Retry-After; no lookups before it
+_paused_until = 0.0
+
+# lookup result for domains not checked because of the rate-limit pause;
+# unlike a failure (None) it doesn't count towards the row's backoff
+SKIPPED = object()
+
 # -------------------------------
 # Database connection
 # -------------------------------
-def get_db_connection():
-    return pymysql.connect(
-        host=DB_HOST,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        database=DB_NAME,
-        cursorclass=pymysql.cursors.DictCursor
-    )
+DB_SETTINGS = dict(
+    host=DB_HOST,
+    user=DB_USER,
+    password=DB_PASSWORD,
+    database=DB_NAME,
+    cursorclass=pymysql.cursors.DictCursor
+)
+# the pending SELECT and the notified UPDATE are single statements, so
+# autocommit them and skip the pool's ROLLBACK-on-return
+POOL = PooledDB(creator=pymysql, mincached=1, maxcached=5, maxconnections=5,
+                blocking=True, reset=False, autocommit=True, **DB_SETTINGS)
+# save_results() batches many UPDATEs under one COMMIT
+TX_POOL = PooledDB(creator=pymysql, mincached=0, maxcached=2, maxconnections=2,
+                   blocking=True, autocommit=False, **DB_SETTINGS)
+
+def get_db_connection(transactional=False):
+    return (TX_POOL if transactional else POOL).connection()
 
 # -------------------------------
 # Check domain availability
 # -------------------------------
-async def check_domain_availability(domain: str) -> bool:
-    url = f"https://domain-availability.whoisxmlapi.com/api/v1?apiKey={WHOISXML_API_KEY}&domainName={domain}&outputFormat=JSON"
+async def check_domain_availability(domain: str):
+    """Returns True if AVAILABLE, False if not, None if the lookup failed
+    and should be retried with backoff, or SKIPPED if the API is rate
+    limiting us and the domain wasn't really checked."""
+    global _paused_until
+    if time.monotonic() < _paused_until:
+        return SKIPPED
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            r = await client.get(url)
-            data = r.json()
+        r = await CLIENT.get(WHOISXML_URL, params={**WHOISXML_PARAMS, "domainName": domain})
+        if r.status_code == 429 or r.headers.get("X-RateLimit-Remaining") == "0":
+            retry_after = r.headers.get("Retry-After", "")
+            pause = int(retry_after) if retry_after.isdigit() else BACKOFF_BASE
+            _paused_until = max(_paused_until, time.monotonic() + pause)
+            log.warning("WhoisXML rate limit reached, pausing lookups for %ss", pause)
+        if r.status_code == 429:
+            return SKIPPED
+        if not r.is_success:
+            log.error("WHOIS check failed for %s: HTTP %s", domain, r.status_code)
+            return None
+        data = orjson.loads(r.content)
         status = data.get("DomainInfo", {}).get("domainAvailability", "UNKNOWN")
         return status == "AVAILABLE"
     except Exception as e:
-        print(f"[ERROR] WHOIS check failed for {domain}: {e}")
-        return False
+        log.error("WHOIS check failed for %s: %s", domain, e)
+        return None
+
+async def check_records(records):
+    """Check every record's domain concurrently, at most CHECK_CONCURRENCY
+    in flight. Returns (record, available) pairs in input order, with
+    available None for failed lookups and SKIPPED for rate-limited ones."""
+    sem = asyncio.Semaphore(CHECK_CONCURRENCY)
+
+    async def one(record):
+        async with sem:
+            return record, await check_domain_availability(record["domain_name"])
+
+    return await asyncio.gather(*[one(r) for r in records])
 
 # -------------------------------
 # Send email notification
 # -------------------------------
-def send_email_notification(to_email, domain):
+def send_email_notification(server, to_email, domain):
+    """Send one notification over an already logged-in SMTP session."""
     subject = f"🎉 {domain} is now available!"
     body = f"Good news! The domain '{domain}' is now available for registration.\n\nVisit your registrar to claim it before someone else does!"
     
@@ -61,61 +150,188 @@ def send_email_notification(to_email, domain):
     msg["From"] = EMAIL_USER
     msg["To"] = to_email
 
+    try:
+        server.send_message(msg)
+        log.info("✅ Email sent to %s for %s", to_email, domain)
+        return True
+    except Exception as e:
+        log.error("❌ Failed to send email to %s: %s", to_email, e)
+        return False
+
+def send_notifications(records):
+    """Email every record over a single SMTP session. Returns the ids of
+    the records whose email went out."""
+    sent_ids = []
     try:
         with smtplib.SMTP(EMAIL_HOST, EMAIL_PORT) as server:
             server.starttls()
             server.login(EMAIL_USER, EMAIL_PASSWORD)
-            server.send_message(msg)
-        print(f"✅ Email sent to {to_email} for {domain}")
-        return True
+            for record in records:
+                if send_email_notification(server, record["email"], record["domain_name"]):
+                    sent_ids.append(record["id"])
     except Exception as e:
-        print(f"❌ Failed to send email to {to_email}: {e}")
-        return False
+        log.error("❌ SMTP session to %s failed: %s", EMAIL_HOST, e)
+    return sent_ids
 
 # -------------------------------
-# Main loop
+# Database updates
 # -------------------------------
-import asyncio
+def fetch_pending():
+    """Pending rows not checked within RECHECK_HOURS and not backing off,
+    oldest first; served by idx_pending (notified, last_checked_at)."""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT id, domain_name, email, fail_count FROM domain_notifications
+                WHERE notified = 0
+                  AND (last_checked_at IS NULL OR last_checked_at < NOW() - INTERVAL %s HOUR)
+                  AND (next_check_at IS NULL OR next_check_at <= NOW())
+                ORDER BY last_checked_at
+                LIMIT %s
+                """,
+                (RECHECK_HOURS, BATCH_SIZE)
+            )
+            return cursor.fetchall()
+    finally:
+        conn.close()
+
+def backoff_seconds(fail_count):
+    """Exponential backoff with +/-20% jitter, capped at BACKOFF_MAX."""
+    delay = min(BACKOFF_BASE * 2 ** fail_count, BACKOFF_MAX)
+    return int(delay * random.uniform(0.8, 1.2))
 
-def check_and_notify():
+def save_results(unavailable_ids, failed):
+    """Stamp rows that are still unavailable and push failed (id, delay)
+    rows back, in one commit. Notified rows are stamped by mark_notified();
+    rows whose email failed come back here as failed after the sends."""
+    conn = get_db_connection(transactional=True)
+    try:
+        with conn.cursor() as cursor:
+            if unavailable_ids:
+                placeholders = ",".join(["%s"] * len(unavailable_ids))
+                cursor.execute(
+                    f"""UPDATE domain_notifications
+                        SET last_checked_at = NOW(), fail_count = 0, next_check_at = NULL
+                        WHERE id IN ({placeholders})""",
+                    unavailable_ids
+                )
+            if failed:
+                cursor.executemany(
+                    """UPDATE domain_notifications
+                       SET fail_count = fail_count + 1, next_check_at = NOW() + INTERVAL %s SECOND
+                       WHERE id = %s""",
+                    [(delay, record_id) for record_id, delay in failed]
+                )
+        conn.commit()
+    finally:
+        conn.close()
+
+def mark_notified(ids):
+    """Flag all successfully notified rows in one statement."""
+    placeholders = ",".join(["%s"] * len(ids))
     conn = get_db_connection()
-    with conn.cursor() as cursor:
-        cursor.execute("SELECT * FROM domain_notifications WHERE notified = 0")
-        records = cursor.fetchall()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"""UPDATE domain_notifications
+                    SET notified = 1, last_checked_at = NOW(), fail_count = 0, next_check_at = NULL
+                    WHERE id IN ({placeholders})""",
+                ids
+            )
+    finally:
+        conn.close()
+
+# -------------------------------
+# Main loop
+# -------------------------------
+async def check_and_notify():
+    if time.monotonic() < _paused_until:
+        log.info("WhoisXML rate limit pause in effect, skipping this pass.")
+        return
+
+    records = await asyncio.to_thread(fetch_pending)
 
     if not records:
-        print("No pending notifications. Sleeping...")
-        conn.close()
+        log.info("No pending notifications. Sleeping...")
         return
 
-    for record in records:
-        domain = record["domain_name"]
-        email = record["email"]
-        print(f"🔍 Checking {domain} for {email}...")
-
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        available = loop.run_until_complete(check_domain_availability(domain))
-
-        if available:
-            success = send_email_notification(email, domain)
-            if success:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        "UPDATE domain_notifications SET notified = 1 WHERE id = %s",
-                        (record["id"],)
-                    )
-                conn.commit()
+    log.info("🔍 Checking %d pending domain(s)...", len(records))
+    results = await check_records(records)
+
+    unavailable_ids, failed, to_notify = [], [], []
+    for record, available in results:
+        if available is SKIPPED:
+            # untouched: picked up again by the first pass after the pause
+            continue
+        if available is None:
+            failed.append((record["id"], backoff_seconds(record["fail_count"])))
+        elif available:
+            to_notify.append(record)
         else:
-            print(f"❌ {domain} still not available.")
-    conn.close()
+            unavailable_ids.append(record["id"])
+            log.debug("❌ %s still not available.", record["domain_name"])
+
+    # smtplib sessions aren't thread-safe, so each thread gets its own
+    # session and shard; the sends overlap the DB update, which only
+    # touches unavailable and failed rows and so doesn't depend on them
+    shards = [to_notify[i::SMTP_SESSIONS] for i in range(SMTP_SESSIONS)]
+    # return_exceptions: a failed DB update must not skip mark_notified()
+    # for emails that already went out, or the next pass sends them again
+    saved, *sent = await asyncio.gather(
+        asyncio.to_thread(save_results, unavailable_ids, failed),
+        *[asyncio.to_thread(send_notifications, shard) for shard in shards if shard],
+        return_exceptions=True,
+    )
+
+    notified_ids = []
+    for ids in sent:
+        if isinstance(ids, Exception):
+            log.error("❌ Sending notifications failed: %s", ids)
+        else:
+            notified_ids.extend(ids)
+    if notified_ids:
+        await asyncio.to_thread(mark_notified, notified_ids)
+
+    # available but not emailed (SMTP down, bad send): back off like a
+    # failed lookup, so these rows aren't re-queried every poll
+    sent_ids = set(notified_ids)
+    unsent = [
+        (record["id"], backoff_seconds(record["fail_count"]))
+        for record in to_notify if record["id"] not in sent_ids
+    ]
+    if unsent:
+        await asyncio.to_thread(save_results, [], unsent)
+
+    if isinstance(saved, Exception):
+        log.error("Saving check results failed: %s", saved)
+
+async def main():
+    await warm_connection()
+    scheduler = AsyncIOScheduler()
+    # coalesce + max_instances=1: a slow pass delays the next one instead of overlapping it
+    scheduler.add_job(
+        check_and_notify, "interval", seconds=POLL_SECONDS,
+        next_run_time=datetime.now(), coalesce=True, max_instances=1
+    )
+    scheduler.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        scheduler.shutdown(wait=False)
+        await CLIENT.aclose()
 
-# -------------------------------
-# Schedule every 6 hours
-# -------------------------------
 if __name__ == "__main__":
-    print("🚀 Notifier started! Checking every 6 hours...")
-    while True:
-        check_and_notify()
-        print("⏰ Sleeping for 6 hours...")
-        time.sleep(30)  # every 30 seconds (for testing)
\ No newline at end of file
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+    # httpx logs every request at INFO, full URL included, which carries the apiKey
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("httpcore").setLevel(logging.WARNING)
+    log.info("🚀 Notifier started! Polling every %ss, rechecking each domain every %sh...", POLL_SECONDS, RECHECK_HOURS)
+    try:
+        asyncio.run(main())
+    except (KeyboardInterrupt, SystemExit):
+        pass